@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Build Bookr's offline metadata store from Open Library data dumps.
+Streams the gzip dumps from https://openlibrary.org/developers/dumps (TSV:
+type, key, revision, last_modified, JSON) or gzip JSON-lines exports into an
+indexed SQLite file that main.py checks before calling openlibrary.org.
+
+Load authors and works before editions so names and first sentences resolve:
+  python3 import_openlibrary_dump.py ol_dump_authors.txt.gz ol_dump_works.txt.gz ol_dump_editions.txt.gz
+Writes to $METADATA_DB_PATH (default ./data/openlibrary.db).
+"""
+import gzip, json, os, re, sqlite3, sys, time
+from pathlib import Path
+
+METADATA_DB_PATH = Path(os.getenv("METADATA_DB_PATH", "./data/openlibrary.db"))
+BATCH = 10_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS authors (
+    key             TEXT PRIMARY KEY,
+    name            TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS works (
+    key             TEXT PRIMARY KEY,
+    title           TEXT,
+    author_key      TEXT,
+    first_sentence  TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS editions (
+    key             TEXT PRIMARY KEY,
+    work_key        TEXT,
+    title           TEXT,
+    title_norm      TEXT,
+    author_key      TEXT,
+    publisher       TEXT,
+    publish_year    INTEGER,
+    cover_id        INTEGER,
+    author_norm     TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS isbns (
+    isbn            TEXT PRIMARY KEY,
+    edition_key     TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Filled once everything is loaded, since an edition's author may only be named via its work
+AUTHOR_NORM = """
+UPDATE editions SET author_norm = (
+    SELECT surname(a.name) FROM authors a
+    WHERE a.key = COALESCE(editions.author_key, (SELECT w.author_key FROM works w WHERE w.key = editions.work_key))
+)
+WHERE author_norm IS NULL
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_editions_title_author ON editions(title_norm, author_norm);
+"""
+
+
+def normalize(s):
+    # Must stay in step with main._normalize_key
+    s = re.sub(r"[^\w\s]", "", (s or "").lower())
+    return re.sub(r"\s+", " ", s).strip()
+
+
+def surname(name):
+    # Must stay in step with the surname main._lookup_local matches on
+    words = normalize(name).split(" ")
+    return words[-1] or None
+
+
+def year_from(value):
+    match = re.search(r"\d{4}", str(value or ""))
+    return int(match.group()) if match else None
+
+
+def text_value(value):
+    if isinstance(value, dict):
+        return value.get("value")
+    return value if isinstance(value, str) else None
+
+
+def records(path):
+    """Yield (type, record) from a TSV dump or a JSON-lines file, gzip or plain."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                if line.startswith("{"):
+                    rec = json.loads(line)
+                else:
+                    rec = json.loads(line.rstrip("\n").split("\t", 4)[4])
+            except (IndexError, json.JSONDecodeError):
+                continue
+            yield (rec.get("type") or {}).get("key"), rec
+
+
+def author_row(rec):
+    return (rec["key"], rec.get("name") or rec.get("personal_name"))
+
+
+def work_row(rec):
+    authors = rec.get("authors") or [{}]
+    author_key = ((authors[0] or {}).get("author") or {}).get("key")
+    return (rec["key"], rec.get("title"), author_key, text_value(rec.get("first_sentence")))
+
+
+def edition_rows(rec):
+    title = rec.get("title")
+    if not title:
+        return None, []
+    works = rec.get("works") or [{}]
+    authors = rec.get("authors") or [{}]
+    covers = [c for c in rec.get("covers") or [] if isinstance(c, int) and c > 0]
+    edition = (
+        rec["key"],
+        works[0].get("key"),
+        title,
+        normalize(title),
+        authors[0].get("key"),
+        (rec.get("publishers") or [None])[0],
+        year_from(rec.get("publish_date")),
+        covers[0] if covers else None,
+        None,  # author_norm, see AUTHOR_NORM
+    )
+    isbns = []
+    for raw in (rec.get("isbn_13") or []) + (rec.get("isbn_10") or []):
+        clean = str(raw).replace("-", "").replace(" ", "").upper()
+        if len(clean) in (10, 13):
+            isbns.append((clean, rec["key"]))
+    return edition, isbns
+
+
+def load(conn, path):
+    authors, works, editions, isbns = [], [], [], []
+    counts = {"authors": 0, "works": 0, "editions": 0}
+
+    def flush():
+        conn.executemany("INSERT OR REPLACE INTO authors VALUES (?,?)", authors)
+        conn.executemany("INSERT OR REPLACE INTO works VALUES (?,?,?,?)", works)
+        conn.executemany("INSERT OR REPLACE INTO editions VALUES (?,?,?,?,?,?,?,?,?)", editions)
+        conn.executemany("INSERT OR REPLACE INTO isbns VALUES (?,?)", isbns)
+        conn.commit()
+        for buf in (authors, works, editions, isbns):
+            buf.clear()
+
+    for rtype, rec in records(path):
+        if "key" not in rec:
+            continue
+        if rtype == "/type/author":
+            authors.append(author_row(rec))
+            counts["authors"] += 1
+        elif rtype == "/type/work":
+            works.append(work_row(rec))
+            counts["works"] += 1
+        elif rtype == "/type/edition":
+            edition, edition_isbns = edition_rows(rec)
+            if edition:
+                editions.append(edition)
+                isbns.extend(edition_isbns)
+                counts["editions"] += 1
+        if len(authors) + len(works) + len(editions) >= BATCH:
+            flush()
+    flush()
+    return counts
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    METADATA_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(METADATA_DB_PATH))
+    # Bulk load: the store is rebuilt from the dump, so durability doesn't matter here
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executescript(SCHEMA)
+    try:
+        conn.execute("ALTER TABLE editions ADD COLUMN author_norm TEXT")  # stores built before author_norm
+    except sqlite3.OperationalError:
+        pass
+    conn.create_function("surname", 1, surname, deterministic=True)
+
+    for path in sys.argv[1:]:
+        started = time.time()
+        print(f"Loading {path}...")
+        counts = load(conn, path)
+        print(f"  {counts['authors']} authors, {counts['works']} works, "
+              f"{counts['editions']} editions in {time.time() - started:.0f}s")
+
+    print("Resolving author surnames...")
+    conn.execute(AUTHOR_NORM)
+    conn.commit()
+    print("Building indexes...")
+    conn.executescript(INDEXES)
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    print(f"\nDone — metadata store at {METADATA_DB_PATH}")
@@ -1,18 +1,42 @@
+import asyncio
 import base64
+import bisect
 import csv
+import gzip
 import io
 import json
+import logging
+import mmap
 import os
+import random
+import re
+import secrets
+import shutil
 import sqlite3
+import tempfile
+import threading
 import time
+import zlib
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import partial
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Optional, Union
 
 import httpx
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import Depends, FastAPI, File, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
 
 # ---------------------------------------------------------------------------
 # Config
@@ -27,19 +51,175 @@ USE_OLLAMA = os.getenv("USE_OLLAMA", "false").lower() == "true"
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "")
 CLAUDE_MODEL = os.getenv("CLAUDE_MODEL", "claude-sonnet-4-6")
 
+# Diagnostics: admin-only endpoints/profiling need ADMIN_TOKEN; SLOW_QUERY_MS=0 disables the slow-query log
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(DB_PATH.parent / "profiles")))
+# Snapshots: BACKUP_INTERVAL_HOURS=0 disables the scheduled copy
+BACKUP_DIR = Path(os.getenv("BACKUP_DIR", str(DB_PATH.parent / "backups")))
+BACKUP_INTERVAL_HOURS = float(os.getenv("BACKUP_INTERVAL_HOURS", "0"))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))  # per library; 0 keeps every snapshot
+
+# Named libraries: "default" lives at DB_PATH, every other one in LIBRARIES_DIR/<name>.db
+LIBRARIES_DIR = Path(os.getenv("LIBRARIES_DIR", str(DB_PATH.parent / "libraries")))
+DEFAULT_LIBRARY = "default"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))  # idle connections kept per library
+
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
+logger = logging.getLogger("bookr")
+slow_queries: deque = deque(maxlen=200)
+
 # ---------------------------------------------------------------------------
 # FastAPI app
 # ---------------------------------------------------------------------------
-app = FastAPI(title="Bookr", version="1.0.0")
+# Long-running coroutines started with the app (scheduled backups etc.); see @background_job
+background_jobs: list = []
+
+
+def background_job(fn):
+    background_jobs.append(fn)
+    return fn
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = [asyncio.create_task(job()) for job in background_jobs]
+    yield
+    for task in tasks:
+        task.cancel()
+
+
+app = FastAPI(title="Bookr", version="1.0.0", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+
+class LibraryRouter:
+    """Pick the library for a request from a ``/lib/<name>/...`` prefix or ``X-Library`` header.
+
+    The prefix is stripped before routing, so ``/lib/home/api/books`` is
+    ``/api/books`` against the ``home`` library (and ``/lib/home/`` serves the UI).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        name = DEFAULT_LIBRARY
+        match = re.match(r"^/lib/([^/]+)(/.*)?$", scope["path"])
+        if match:
+            name, path = match.group(1), match.group(2) or "/"
+            scope = dict(scope, path=path, raw_path=path.encode())
+        else:
+            for key, value in scope["headers"]:
+                if key == b"x-library":
+                    name = value.decode("latin-1").strip() or DEFAULT_LIBRARY
+        if not library_exists(name):
+            response = JSONResponse({"detail": f"Unknown library: {name}"}, status_code=404)
+            return await response(scope, receive, send)
+        token = current_library.set(name)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_library.reset(token)
+
+
+def dumps_json(content) -> bytes:
+    """Compact JSON bytes, via orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response that skips jsonable_encoder and uses orjson when available."""
+
+    def render(self, content) -> bytes:
+        return dumps_json(content)
+
+
+def _is_admin(request: Request) -> bool:
+    token = request.headers.get("x-admin-token", "")
+    return bool(ADMIN_TOKEN) and secrets.compare_digest(token, ADMIN_TOKEN)
+
+
+def require_admin(request: Request) -> None:
+    if not _is_admin(request):
+        raise HTTPException(403, "Admin token required")
+
+
+def _profile_requested(request: Request) -> bool:
+    flag = request.headers.get("x-profile") or request.query_params.get("profile") or ""
+    return flag.strip().lower() in ("1", "true")
+
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """Profile one request when an admin sends ``X-Profile: 1`` or ``?profile=1``.
+
+    Uses pyinstrument's sampling profiler when installed (cProfile otherwise),
+    saves the report under PROFILE_DIR and points to it in the X-Profile header.
+    Profiling runs until the response body has been sent, so streamed exports
+    include their serialization; an SSE stream's report is written when it closes.
+    """
+    if not _profile_requested(request) or not _is_admin(request):
+        return await call_next(request)
+
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    stem = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{request.url.path.strip('/').replace('/', '_')}"
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        start, stop, name = profiler.enable, profiler.disable, f"{stem}.txt"
+
+        def report() -> str:
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(60)
+            return out.getvalue()
+    else:
+        profiler = Profiler(interval=0.001, async_mode="enabled")
+        start, stop, name = profiler.start, profiler.stop, f"{stem}.html"
+        report = profiler.output_html
+
+    def finish() -> None:
+        stop()
+        (PROFILE_DIR / name).write_text(report())
+
+    start()
+    try:
+        response = await call_next(request)
+    except BaseException:
+        finish()
+        raise
+    body = response.body_iterator
+
+    async def profiled_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            finish()
+
+    response.body_iterator = profiled_body()
+    response.headers["X-Profile"] = f"/api/admin/profiles/{name}"
+    return response
+
+
+# Added last so it wraps everything else and the library is set before any handler runs
+app.add_middleware(LibraryRouter)
 
 # ---------------------------------------------------------------------------
 # Database
@@ -62,37 +242,477 @@ CREATE TABLE IF NOT EXISTS books (
 )
 """
 
+# Every write bumps one library-wide revision counter; rows and delete tombstones
+# carry the revision they were last touched at so clients can sync by delta.
+CHANGE_TRACKING = """
+CREATE TABLE IF NOT EXISTS library_revision (
+    id              INTEGER PRIMARY KEY CHECK (id = 1),
+    rev             INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO library_revision (id, rev) VALUES (1, 0);
 
-def get_db() -> sqlite3.Connection:
-    conn = sqlite3.connect(str(DB_PATH))
+CREATE TABLE IF NOT EXISTS book_tombstones (
+    id              INTEGER PRIMARY KEY,
+    revision        INTEGER NOT NULL,
+    deleted_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_books_revision ON books(revision);
+CREATE INDEX IF NOT EXISTS idx_tombstones_revision ON book_tombstones(revision);
+
+CREATE TRIGGER IF NOT EXISTS books_track_insert AFTER INSERT ON books
+BEGIN
+    UPDATE library_revision SET rev = rev + 1 WHERE id = 1;
+    UPDATE books SET revision = (SELECT rev FROM library_revision WHERE id = 1),
+                     updated_at = CURRENT_TIMESTAMP
+    WHERE id = NEW.id;
+    DELETE FROM book_tombstones WHERE id = NEW.id;
+END;
+
+-- The WHEN guard skips the trigger's own revision bump
+CREATE TRIGGER IF NOT EXISTS books_track_update AFTER UPDATE ON books
+WHEN NEW.revision IS OLD.revision
+BEGIN
+    UPDATE library_revision SET rev = rev + 1 WHERE id = 1;
+    UPDATE books SET revision = (SELECT rev FROM library_revision WHERE id = 1),
+                     updated_at = CURRENT_TIMESTAMP
+    WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_track_delete AFTER DELETE ON books
+BEGIN
+    UPDATE library_revision SET rev = rev + 1 WHERE id = 1;
+    INSERT OR REPLACE INTO book_tombstones (id, revision)
+    VALUES (OLD.id, (SELECT rev FROM library_revision WHERE id = 1));
+END;
+"""
+
+# Books whose Open Library lookup failed or found nothing, retried by enrichment_worker
+ENRICHMENT_BACKLOG = """
+CREATE TABLE IF NOT EXISTS enrichment_backlog (
+    book_id         INTEGER PRIMARY KEY,
+    status          TEXT NOT NULL DEFAULT 'pending',  -- pending | done | gave_up
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error      TEXT,
+    queued_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at      TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_backlog_due ON enrichment_backlog(status, next_attempt_at);
+
+CREATE TRIGGER IF NOT EXISTS books_backlog_delete AFTER DELETE ON books
+BEGIN
+    DELETE FROM enrichment_backlog WHERE book_id = OLD.id;
+END;
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_books_section ON books(section);
+CREATE INDEX IF NOT EXISTS idx_books_isbn ON books(isbn);
+CREATE INDEX IF NOT EXISTS idx_books_isbn_norm ON books(REPLACE(REPLACE(UPPER(isbn), '-', ''), ' ', ''));
+CREATE INDEX IF NOT EXISTS idx_books_author ON books(author);
+CREATE INDEX IF NOT EXISTS idx_books_publisher ON books(publisher);
+CREATE INDEX IF NOT EXISTS idx_books_publish_year ON books(publish_year);
+CREATE INDEX IF NOT EXISTS idx_books_owned ON books(owned);
+"""
+
+# SQL twin of _normalize_isbn's cleanup; must match idx_books_isbn_norm exactly to use it
+ISBN_NORM_SQL = "REPLACE(REPLACE(UPPER(isbn), '-', ''), ' ', '')"
+
+BOOK_COLUMNS = (
+    "id", "title", "author", "isbn", "cover_url", "description", "publisher", "publish_year",
+    "open_library_key", "section", "owned", "source_image", "added_at", "shelf_location",
+    "updated_at", "revision",
+)
+PATCHABLE_FIELDS = {"owned", "title", "author", "section", "cover_url", "isbn", "shelf_location"}
+# What the library grid renders; description/source_image are only fetched for the modal
+CARD_FIELDS = (
+    "id", "title", "author", "cover_url", "section", "owned", "publish_year", "isbn", "shelf_location", "revision",
+)
+
+
+def _select_columns(fields: Optional[str]) -> str:
+    """Turn a ``fields=`` value (``card``, ``all`` or a comma list) into a safe SELECT list."""
+    if not fields or fields == "card":
+        return ", ".join(CARD_FIELDS)
+    if fields == "all":
+        return "*"
+    cols = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [c for c in cols if c not in BOOK_COLUMNS]
+    if unknown:
+        raise HTTPException(400, f"Unknown fields: {', '.join(unknown)}")
+    if "id" not in cols:
+        cols.insert(0, "id")
+    return ", ".join(dict.fromkeys(cols))
+
+
+# ---------------------------------------------------------------------------
+# Libraries (one SQLite file each)
+# ---------------------------------------------------------------------------
+LIBRARY_NAME = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+current_library: ContextVar[str] = ContextVar("current_library", default=DEFAULT_LIBRARY)
+
+_pools: dict[str, list] = {}
+_prepared: set[str] = set()
+
+
+def library_path(name: str) -> Path:
+    return DB_PATH if name == DEFAULT_LIBRARY else LIBRARIES_DIR / f"{name}.db"
+
+
+def library_exists(name: str) -> bool:
+    return name == DEFAULT_LIBRARY or (bool(LIBRARY_NAME.match(name)) and library_path(name).exists())
+
+
+def list_libraries() -> list[str]:
+    names = [DEFAULT_LIBRARY]
+    if LIBRARIES_DIR.exists():
+        names += sorted(
+            p.stem for p in LIBRARIES_DIR.glob("*.db") if LIBRARY_NAME.match(p.stem) and p.stem != DEFAULT_LIBRARY
+        )
+    return names
+
+
+class LibraryConnection(sqlite3.Connection):
+    """Pooled connection that also records statements running longer than SLOW_QUERY_MS.
+
+    close() hands connections from get_db() back to their library's pool.
+    For slow queries, the trace callback notes when each statement starts and
+    the progress handler ticks every few thousand VM steps, keeping the longest
+    elapsed time seen per statement. Query plans are captured in close(),
+    because a connection can't run queries from inside its own callbacks.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.library: Optional[str] = None
+        self._statement: Optional[str] = None
+        self._started = 0.0
+        self._slow: dict[str, float] = {}
+        if SLOW_QUERY_MS > 0:
+            self.set_trace_callback(self._on_statement)
+            self.set_progress_handler(self._on_progress, 10_000)
+
+    def _on_statement(self, sql: str) -> None:
+        if sql.startswith("--"):
+            return  # statement inside a trigger; keep timing the outer one
+        self._statement = sql
+        self._started = time.perf_counter()
+
+    def _on_progress(self) -> int:
+        elapsed = (time.perf_counter() - self._started) * 1000
+        if self._statement and elapsed >= SLOW_QUERY_MS:
+            self._slow[self._statement] = max(elapsed, self._slow.get(self._statement, 0.0))
+        return 0
+
+    def _log_slow(self) -> None:
+        self.set_trace_callback(None)
+        for sql, elapsed in self._slow.items():
+            try:
+                plan = [r[3] for r in self.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+            except sqlite3.Error:
+                plan = []
+            entry = {
+                "at": time.time(), "library": self.library, "ms": round(elapsed, 1), "sql": sql[:2000], "plan": plan,
+            }
+            slow_queries.append(entry)
+            logger.warning("slow query (%.0f ms): %s | plan: %s", elapsed, entry["sql"], "; ".join(plan))
+        self._slow.clear()
+        self.set_trace_callback(self._on_statement)
+
+    def close(self) -> None:
+        if self._slow:
+            self._log_slow()
+        pool = _pools.get(self.library) if self.library else None
+        if pool is not None and len(pool) < DB_POOL_SIZE:
+            if self.in_transaction:
+                self.rollback()
+            self._statement = None
+            pool.append(self)
+            return
+        super().close()
+
+
+def _connect(path: Path) -> LibraryConnection:
+    conn = sqlite3.connect(str(path), factory=LibraryConnection, check_same_thread=False)
     conn.row_factory = sqlite3.Row
     return conn
 
 
-def init_db() -> None:
-    conn = get_db()
+def get_db(library: Optional[str] = None) -> sqlite3.Connection:
+    """Connection to ``library`` (default: the request's library), reused from its pool."""
+    name = library or current_library.get()
+    if name not in _prepared:
+        prepare_library(name)
+    pool = _pools.setdefault(name, [])
+    if pool:
+        return pool.pop()
+    conn = _connect(library_path(name))
+    conn.library = name
+    return conn
+
+
+def init_db(path: Path = DB_PATH) -> None:
+    conn = _connect(path)
     conn.execute(SCHEMA)
     conn.commit()
     conn.close()
 
 
-def migrate_db() -> None:
-    conn = get_db()
+def migrate_db(path: Path = DB_PATH) -> None:
+    conn = _connect(path)
     for stmt in [
         "ALTER TABLE books ADD COLUMN section TEXT",
         "ALTER TABLE books ADD COLUMN owned INTEGER NOT NULL DEFAULT 1",
         "ALTER TABLE books ADD COLUMN shelf_location TEXT",
+        "ALTER TABLE books ADD COLUMN updated_at TIMESTAMP",
+        "ALTER TABLE books ADD COLUMN revision INTEGER NOT NULL DEFAULT 0",
     ]:
         try:
             conn.execute(stmt)
             conn.commit()
         except sqlite3.OperationalError:
             pass  # column already exists
+    # Rows that predate change tracking count as revision 1 (backfilled before the triggers exist)
+    conn.execute("UPDATE books SET updated_at = added_at WHERE updated_at IS NULL")
+    conn.execute("UPDATE books SET revision = 1 WHERE revision = 0")
+    conn.commit()
+    conn.executescript(CHANGE_TRACKING)
+    conn.executescript(ENRICHMENT_BACKLOG)
+    conn.executescript(INDEXES)
+    conn.execute("UPDATE library_revision SET rev = MAX(rev, 1) WHERE id = 1")
+    conn.commit()
     conn.close()
 
 
-init_db()
-migrate_db()
+def _current_revision(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT rev FROM library_revision WHERE id = 1").fetchone()[0]
+
+
+def _read_changes(conn: sqlite3.Connection, since: int, columns: str) -> dict:
+    revision = _current_revision(conn)
+    rows = conn.execute(
+        f"SELECT {columns} FROM books WHERE revision > ? ORDER BY revision", (since,)
+    ).fetchall()
+    deleted = conn.execute(
+        "SELECT id FROM book_tombstones WHERE revision > ? ORDER BY revision", (since,)
+    ).fetchall()
+    return {
+        "since": since,
+        "revision": revision,
+        "changed": [dict(r) for r in rows],
+        "deleted": [r[0] for r in deleted],
+    }
+
+
+def prepare_library(name: str) -> None:
+    """Create/migrate a library's database the first time this process touches it."""
+    path = library_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    init_db(path)
+    migrate_db(path)
+    _prepared.add(name)
+
+
+prepare_library(DEFAULT_LIBRARY)
+
+# ---------------------------------------------------------------------------
+# Live change feed (server-sent events)
+# ---------------------------------------------------------------------------
+EVENTS_COALESCE_MS = int(os.getenv("EVENTS_COALESCE_MS", "250"))
+EVENTS_KEEPALIVE = 15
+
+
+class ChangeFeed:
+    """Fan library changes out to SSE subscribers, coalescing bursts of writes.
+
+    Write paths call ``notify()``; the first call in a quiet period schedules a
+    flush ``EVENTS_COALESCE_MS`` later, which reads every change since the last
+    broadcast revision and sends it as one message. A 40-book scan is one event.
+    """
+
+    def __init__(self, library: str, window_ms: int):
+        self.library = library
+        self.window = window_ms / 1000
+        self.subscribers: set[asyncio.Queue] = set()
+        self.revision: Optional[int] = None
+        self._flush: Optional[asyncio.Task] = None
+
+    def subscribe(self) -> asyncio.Queue:
+        if self.revision is None:
+            conn = get_db(self.library)
+            self.revision = _current_revision(conn)
+            conn.close()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=64)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self.subscribers.discard(queue)
+        if not self.subscribers:
+            self.revision = None  # re-read on next subscribe; nobody is tracking
+
+    def notify(self) -> None:
+        if not self.subscribers or self._flush is not None:
+            return
+        self._flush = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.window)
+        self._flush = None
+        if not self.subscribers or self.revision is None:
+            return
+        conn = get_db(self.library)
+        changes = _read_changes(conn, self.revision, ", ".join(CARD_FIELDS))
+        conn.close()
+        if changes["revision"] == self.revision:
+            return
+        self.revision = changes["revision"]
+        payload = json.dumps(changes, separators=(",", ":"))
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                pass  # slow client; it sees the revision gap and re-fetches
+
+
+_feeds: dict[str, ChangeFeed] = {}
+
+
+def change_feed() -> ChangeFeed:
+    """The change feed for the current request's library."""
+    name = current_library.get()
+    if name not in _feeds:
+        _feeds[name] = ChangeFeed(name, EVENTS_COALESCE_MS)
+    return _feeds[name]
+
+# ---------------------------------------------------------------------------
+# Typeahead index
+# ---------------------------------------------------------------------------
+SUGGEST_FIELDS = ("title", "author", "section")
+SUGGEST_SCAN = 256  # prefix matches ranked per field; bounds work for one-letter prefixes
+
+
+class PrefixIndex:
+    """In-memory sorted term lists behind ``/api/suggest``.
+
+    Every word start of a title/author/section is a key in a per-field sorted
+    list, so a prefix lookup is one bisect plus a short scan. ``sync()`` applies
+    the rows changed since the last revision it saw (the same delta the change
+    feed reads), which makes a write cost the index a few list inserts rather
+    than a rebuild; write paths only mark it stale via ``library_changed()``.
+    Lookups and syncs share one lock and run off the event loop, so a lookup
+    never sees a half-applied delta and waits for a sync already in progress.
+    """
+
+    def __init__(self, library: str):
+        self.library = library
+        self.revision = 0
+        self.stale = True
+        self.books: dict[int, tuple] = {}
+        self.keys: dict[str, list[tuple[str, str]]] = {f: [] for f in SUGGEST_FIELDS}
+        self.terms: dict[str, dict[str, list]] = {f: {} for f in SUGGEST_FIELDS}  # norm -> [display, count]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _word_starts(norm: str) -> list[str]:
+        words = norm.split(" ")
+        return [" ".join(words[i:]) for i in range(len(words))]
+
+    def _add(self, field: str, value: Optional[str]) -> None:
+        norm = _normalize_key(value)
+        if not norm:
+            return
+        term = self.terms[field].get(norm)
+        if term:
+            term[1] += 1
+            return
+        self.terms[field][norm] = [value.strip(), 1]
+        for key in self._word_starts(norm):
+            bisect.insort(self.keys[field], (key, norm))
+
+    def _remove(self, field: str, value: Optional[str]) -> None:
+        norm = _normalize_key(value)
+        term = self.terms[field].get(norm)
+        if not term:
+            return
+        term[1] -= 1
+        if term[1] > 0:
+            return
+        del self.terms[field][norm]
+        keys = self.keys[field]
+        for key in self._word_starts(norm):
+            i = bisect.bisect_left(keys, (key, norm))
+            if i < len(keys) and keys[i] == (key, norm):
+                del keys[i]
+
+    def sync(self) -> None:
+        with self._lock:
+            self._sync()
+
+    def _sync(self) -> None:
+        if not self.stale:
+            return
+        self.stale = False  # cleared first so a write landing mid-sync re-marks it
+        conn = get_db(self.library)
+        changes = _read_changes(conn, self.revision, "id, " + ", ".join(SUGGEST_FIELDS))
+        conn.close()
+        for book_id in changes["deleted"]:
+            for field, value in zip(SUGGEST_FIELDS, self.books.pop(book_id, ())):
+                self._remove(field, value)
+        for row in changes["changed"]:
+            values = tuple(row[f] for f in SUGGEST_FIELDS)
+            old = self.books.get(row["id"])
+            if old == values:
+                continue
+            for field, value in zip(SUGGEST_FIELDS, old or ()):
+                self._remove(field, value)
+            for field, value in zip(SUGGEST_FIELDS, values):
+                self._add(field, value)
+            self.books[row["id"]] = values
+        self.revision = changes["revision"]
+
+    def suggest(self, prefix: str, limit: int) -> dict[str, list[dict]]:
+        with self._lock:
+            self._sync()
+            return self._suggest(_normalize_key(prefix), limit)
+
+    def _suggest(self, prefix: str, limit: int) -> dict[str, list[dict]]:
+        result = {}
+        for field in SUGGEST_FIELDS if prefix else ():
+            keys, terms = self.keys[field], self.terms[field]
+            seen: dict[str, bool] = {}  # norm -> matched at the start of the value
+            i = bisect.bisect_left(keys, (prefix,))
+            while i < len(keys) and len(seen) < SUGGEST_SCAN and keys[i][0].startswith(prefix):
+                key, norm = keys[i]
+                seen[norm] = seen.get(norm, False) or key == norm
+                i += 1
+            ranked = sorted(seen, key=lambda n: (not seen[n], -terms[n][1], n))[:limit]
+            result[field] = [{"value": terms[n][0], "count": terms[n][1]} for n in ranked]
+        return result or {f: [] for f in SUGGEST_FIELDS}
+
+
+_suggest_indexes: dict[str, PrefixIndex] = {}
+
+
+def suggest_index(library: Optional[str] = None) -> PrefixIndex:
+    name = library or current_library.get()
+    if name not in _suggest_indexes:
+        _suggest_indexes[name] = PrefixIndex(name)
+    return _suggest_indexes[name]
+
+
+def library_changed() -> None:
+    """Call after committing writes to the current library's books."""
+    change_feed().notify()
+    suggest_index().stale = True
+
+
+@background_job
+async def build_suggest_indexes() -> None:
+    """Build every library's typeahead index at startup so the first keystroke is fast."""
+    for name in list_libraries():
+        await run_in_threadpool(suggest_index(name).sync)
 
 # ---------------------------------------------------------------------------
 # Vision: extract book list from image
@@ -106,108 +726,293 @@ VISION_PROMPT = (
 )
 
 
+# Uploads are handed to the backends memory-mapped from disk rather than as a bytes copy
+ImageBuffer = Union[bytes, mmap.mmap]
+
+VISION_MAX_TOKENS = int(os.getenv("VISION_MAX_TOKENS", "1500"))
+# Follow-up requests allowed when a dense shelf overruns VISION_MAX_TOKENS
+VISION_MAX_CONTINUATIONS = int(os.getenv("VISION_MAX_CONTINUATIONS", "3"))
+
+
 def _parse_book_list(text: str) -> list[dict]:
-    """Extract JSON array from model response, tolerating extra prose."""
+    """Extract JSON array from model response, tolerating extra prose.
+
+    A truncated array still yields every object that was closed before the cut.
+    """
     text = text.strip()
     start = text.find("[")
-    end = text.rfind("]") + 1
-    if start == -1 or end == 0:
+    if start == -1:
         return []
+    end = text.rfind("]") + 1
     try:
-        items = json.loads(text[start:end])
-        return [i for i in items if isinstance(i, dict) and i.get("title")]
+        items = json.loads(text[start:end]) if end > start else None
     except json.JSONDecodeError:
+        items = None
+
+    if items is None:
+        # Walk the array object by object and keep what decodes
+        decoder = json.JSONDecoder()
+        items, pos = [], start + 1
+        while True:
+            while pos < len(text) and text[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(text) or text[pos] != "{":
+                break
+            try:
+                item, pos = decoder.raw_decode(text, pos)
+            except json.JSONDecodeError:
+                break
+            items.append(item)
+
+    if not isinstance(items, list):
         return []
+    return [i for i in items if isinstance(i, dict) and i.get("title")]
+
+
+def _continuation_prompt(prior: list[dict]) -> str:
+    return (
+        f"Your previous answer was cut off after {len(prior)} books, the last being "
+        f"{json.dumps(prior[-1].get('title'))}. Continue from the next spine after that one. "
+        "Return ONLY a JSON array of the books not yet listed, in the same format."
+    )
 
 
-async def _extract_via_openai(image_bytes: bytes, content_type: str) -> list[dict]:
+async def _extract_via_openai(image_bytes: ImageBuffer, content_type: str, prior: list[dict]) -> tuple[list[dict], bool]:
     from openai import AsyncOpenAI
 
     b64 = base64.b64encode(image_bytes).decode()
     data_url = f"data:{content_type};base64,{b64}"
     client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    messages = [
+        {
+            "role": "user",
+            "content": [
+                {"type": "image_url", "image_url": {"url": data_url, "detail": "high"}},
+                {"type": "text", "text": VISION_PROMPT},
+            ],
+        }
+    ]
+    if prior:
+        messages += [
+            {"role": "assistant", "content": json.dumps(prior)},
+            {"role": "user", "content": _continuation_prompt(prior)},
+        ]
     response = await client.chat.completions.create(
         model=OPENAI_MODEL,
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {"type": "image_url", "image_url": {"url": data_url, "detail": "high"}},
-                    {"type": "text", "text": VISION_PROMPT},
-                ],
-            }
-        ],
-        max_tokens=1500,
+        messages=messages,
+        max_tokens=VISION_MAX_TOKENS,
     )
-    return _parse_book_list(response.choices[0].message.content or "")
+    choice = response.choices[0]
+    return _parse_book_list(choice.message.content or ""), choice.finish_reason == "length"
 
 
-async def _extract_via_ollama(image_bytes: bytes) -> list[dict]:
-    b64 = base64.b64encode(image_bytes).decode()
-    async with httpx.AsyncClient(timeout=180) as client:
-        resp = await client.post(
-            f"{OLLAMA_URL}/api/generate",
-            json={"model": OLLAMA_MODEL, "prompt": VISION_PROMPT, "images": [b64], "stream": False},
-        )
-        resp.raise_for_status()
-        return _parse_book_list(resp.json().get("response", ""))
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # how long Ollama keeps the model loaded; -1 = forever
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "1"))
+
+# Generations beyond the cap wait here in arrival order instead of piling onto one GPU/CPU
+_ollama_slots = asyncio.Semaphore(OLLAMA_MAX_CONCURRENCY)
+ollama_stats = {"in_flight": 0, "waiting": 0, "warm": False, "last": None}
+
+
+def _record_ollama_timings(body: dict, queued_ms: float) -> dict:
+    """Split Ollama's nanosecond durations into model-load vs inference time."""
+    def ns(key: str) -> int:
+        return body.get(key) or 0
+
+    timings = {
+        "queued_ms": round(queued_ms, 1),
+        "load_ms": round(ns("load_duration") / 1e6, 1),
+        "inference_ms": round((ns("prompt_eval_duration") + ns("eval_duration")) / 1e6, 1),
+        "total_ms": round(ns("total_duration") / 1e6, 1),
+    }
+    ollama_stats["last"] = timings
+    ollama_stats["warm"] = True
+    logger.info("ollama %s: queued %.0f ms, load %.0f ms, inference %.0f ms",
+                OLLAMA_MODEL, timings["queued_ms"], timings["load_ms"], timings["inference_ms"])
+    return timings
+
+
+async def _ollama_request_body(image: ImageBuffer, prompt: str, chunk: int = 3 * 64 * 1024) -> AsyncIterator[bytes]:
+    """Stream the /api/generate JSON, base64-encoding the image slice by slice.
+
+    ``chunk`` is a multiple of 3 so the slices concatenate into one valid base64 string.
+    """
+    head = json.dumps({"model": OLLAMA_MODEL, "prompt": prompt, "stream": False, "keep_alive": OLLAMA_KEEP_ALIVE})
+    yield head[:-1].encode() + b', "images": ["'
+    for start in range(0, len(image), chunk):
+        yield base64.b64encode(image[start:start + chunk])
+    yield b'"]}'
+
+
+async def _extract_via_ollama(image_bytes: ImageBuffer, prior: list[dict]) -> tuple[list[dict], bool]:
+    prompt = VISION_PROMPT
+    if prior:
+        # /api/generate is single-turn, so restate what we already have
+        prompt += f"\n\nAlready listed: {json.dumps(prior)}\n{_continuation_prompt(prior)}"
+    queued = time.perf_counter()
+    ollama_stats["waiting"] += 1
+    try:
+        await _ollama_slots.acquire()
+    finally:
+        ollama_stats["waiting"] -= 1  # also when cancelled while queued
+    ollama_stats["in_flight"] += 1
+    queued_ms = (time.perf_counter() - queued) * 1000
+    try:
+        async with httpx.AsyncClient(timeout=180) as client:
+            resp = await client.post(
+                f"{OLLAMA_URL}/api/generate",
+                content=_ollama_request_body(image_bytes, prompt),
+                headers={"Content-Type": "application/json"},
+            )
+            resp.raise_for_status()
+            body = resp.json()
+    finally:
+        ollama_stats["in_flight"] -= 1
+        _ollama_slots.release()
+    _record_ollama_timings(body, queued_ms)
+    return _parse_book_list(body.get("response", "")), body.get("done_reason") == "length"
+
+
+@background_job
+async def warm_ollama() -> None:
+    """Load the vision model at startup so the first scan doesn't pay for it."""
+    if not USE_OLLAMA:
+        return
+    try:
+        async with httpx.AsyncClient(timeout=300) as client:
+            # A generate request without a prompt just loads the model
+            resp = await client.post(
+                f"{OLLAMA_URL}/api/generate",
+                json={"model": OLLAMA_MODEL, "keep_alive": OLLAMA_KEEP_ALIVE},
+            )
+            resp.raise_for_status()
+            body = resp.json()
+    except Exception as e:
+        logger.warning("ollama warm-up failed: %s", e)
+        return
+    ollama_stats["warm"] = True
+    logger.info("ollama %s loaded in %.0f ms (keep_alive=%s)",
+                OLLAMA_MODEL, body.get("load_duration", 0) / 1e6, OLLAMA_KEEP_ALIVE)
 
 
-async def _extract_via_claude(image_bytes: bytes, content_type: str) -> list[dict]:
+async def _extract_via_claude(image_bytes: ImageBuffer, content_type: str, prior: list[dict]) -> tuple[list[dict], bool]:
     import anthropic
     b64 = base64.b64encode(image_bytes).decode()
     client = anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
+    messages = [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "image",
+                    "source": {"type": "base64", "media_type": content_type, "data": b64},
+                    # Continuations re-send the image; let them read it from the prompt cache
+                    "cache_control": {"type": "ephemeral"},
+                },
+                {"type": "text", "text": VISION_PROMPT},
+            ],
+        }
+    ]
+    if prior:
+        messages += [
+            {"role": "assistant", "content": json.dumps(prior)},
+            {"role": "user", "content": _continuation_prompt(prior)},
+        ]
     response = await client.messages.create(
         model=CLAUDE_MODEL,
-        max_tokens=1500,
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image",
-                        "source": {"type": "base64", "media_type": content_type, "data": b64},
-                    },
-                    {"type": "text", "text": VISION_PROMPT},
-                ],
-            }
-        ],
+        max_tokens=VISION_MAX_TOKENS,
+        messages=messages,
     )
-    return _parse_book_list(response.content[0].text)
+    return _parse_book_list(response.content[0].text), response.stop_reason == "max_tokens"
+
+
+SCAN_MEMORY_BUDGET_MB = int(os.getenv("SCAN_MEMORY_BUDGET_MB", "256"))
+
+
+class ByteBudget:
+    """Admit work by bytes in flight rather than by count.
+
+    A reservation larger than the whole budget still runs, but only alone.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self._cond = asyncio.Condition()
+
+    @asynccontextmanager
+    async def reserve(self, size: int):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_use == 0 or self.in_use + size <= self.limit)
+            self.in_use += size
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self.in_use -= size
+                self._cond.notify_all()
+
 
+scan_budget = ByteBudget(SCAN_MEMORY_BUDGET_MB * 1024 * 1024)
 
-async def extract_books(image_bytes: bytes, content_type: str) -> list[dict]:
+
+def _scan_cost(image_size: int) -> int:
+    """Rough peak heap use of one vision call for an image of ``image_size`` bytes."""
     if USE_OLLAMA:
-        return await _extract_via_ollama(image_bytes)
-    if ANTHROPIC_API_KEY:
-        return await _extract_via_claude(image_bytes, content_type)
-    if OPENAI_API_KEY:
-        return await _extract_via_openai(image_bytes, content_type)
-    raise ValueError("No vision backend configured. Set ANTHROPIC_API_KEY, OPENAI_API_KEY, or USE_OLLAMA=true in .env")
+        return image_size  # body is streamed; count the mapped pages being read
+    # SDK backends: base64 bytes + str (1.33x each) plus the serialized request body
+    return image_size * 4
+
+
+async def extract_books(image_bytes: ImageBuffer, content_type: str) -> list[dict]:
+    if USE_OLLAMA:
+        backend = partial(_extract_via_ollama, image_bytes)
+    elif ANTHROPIC_API_KEY:
+        backend = partial(_extract_via_claude, image_bytes, content_type)
+    elif OPENAI_API_KEY:
+        backend = partial(_extract_via_openai, image_bytes, content_type)
+    else:
+        raise ValueError("No vision backend configured. Set ANTHROPIC_API_KEY, OPENAI_API_KEY, or USE_OLLAMA=true in .env")
+
+    books: list[dict] = []
+    for _ in range(1 + VISION_MAX_CONTINUATIONS):
+        # Continuations may repeat books already listed; duplicates within one reply are real copies
+        prior = {(_normalize_key(b.get("title")), _normalize_key(b.get("author"))) for b in books}
+        batch, truncated = await backend(books)
+        new = [b for b in batch if (_normalize_key(b.get("title")), _normalize_key(b.get("author"))) not in prior]
+        books += new
+        # Stop when the model finished on its own, or a continuation made no progress
+        if not truncated or not new:
+            break
+    return books
 
 
 # ---------------------------------------------------------------------------
 # Open Library metadata lookup
 # ---------------------------------------------------------------------------
-async def lookup_metadata(title: str, author: Optional[str]) -> dict:
-    params: dict = {"title": title, "limit": 1}
-    if author:
-        params["author"] = author
+OPEN_LIBRARY_URL = "https://openlibrary.org"
+# Only what we store — a bare search doc carries every edition's ISBN list
+OL_SEARCH_FIELDS = ",".join([
+    "key", "title", "author_name", "cover_i", "first_publish_year", "publisher", "first_sentence",
+    "editions", "editions.key", "editions.title", "editions.isbn", "editions.cover_i", "editions.publisher",
+])
 
-    try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            resp = await client.get("https://openlibrary.org/search.json", params=params)
-            resp.raise_for_status()
-            docs = resp.json().get("docs", [])
-    except Exception:
-        return {"title": title, "author": author}
 
-    if not docs:
-        return {"title": title, "author": author}
+def _normalize_isbn(isbn: Optional[str]) -> Optional[str]:
+    clean = (isbn or "").replace("-", "").replace(" ", "").upper()
+    return clean if len(clean) in (10, 13) else None
+
 
-    doc = docs[0]
-    cover_id = doc.get("cover_i")
-    isbn_list = doc.get("isbn", [])
+def _year_from(value) -> Optional[int]:
+    match = re.search(r"\d{4}", str(value or ""))
+    return int(match.group()) if match else None
+
+
+def _meta_from_search_doc(doc: dict, title: str, author: Optional[str]) -> dict:
+    # With editions.* requested, the best-matching edition is nested under editions.docs
+    edition = ((doc.get("editions") or {}).get("docs") or [{}])[0]
+    cover_id = edition.get("cover_i") or doc.get("cover_i")
+    isbn_list = edition.get("isbn") or []
 
     first_sentence = doc.get("first_sentence")
     description = None
@@ -215,6 +1020,8 @@ async def lookup_metadata(title: str, author: Optional[str]) -> dict:
         description = first_sentence.get("value")
     elif isinstance(first_sentence, str):
         description = first_sentence
+    elif isinstance(first_sentence, list) and first_sentence:
+        description = first_sentence[0]
 
     return {
         "title": doc.get("title") or title,
@@ -222,12 +1029,300 @@ async def lookup_metadata(title: str, author: Optional[str]) -> dict:
         "isbn": isbn_list[0] if isbn_list else None,
         "cover_url": f"https://covers.openlibrary.org/b/id/{cover_id}-M.jpg" if cover_id else None,
         "description": description,
-        "publisher": (doc.get("publisher") or [None])[0],
+        "publisher": (edition.get("publisher") or doc.get("publisher") or [None])[0],
         "publish_year": doc.get("first_publish_year"),
         "open_library_key": doc.get("key"),
     }
 
 
+def _meta_from_edition(data: dict, isbn: str, title: str, author: Optional[str]) -> dict:
+    """Map a ``/api/books?jscmd=data`` edition record onto our metadata dict."""
+    excerpts = data.get("excerpts") or [{}]
+    return {
+        "title": data.get("title") or title,
+        "author": ((data.get("authors") or [{}])[0]).get("name") or author,
+        "isbn": isbn,
+        "cover_url": (data.get("cover") or {}).get("medium"),
+        "description": excerpts[0].get("text"),
+        "publisher": ((data.get("publishers") or [{}])[0]).get("name"),
+        "publish_year": _year_from(data.get("publish_date")),
+        "open_library_key": data.get("key"),
+    }
+
+
+async def _lookup_isbns(client: httpx.AsyncClient, isbns: list[str]) -> dict[str, dict]:
+    """Fetch edition records for several ISBNs in one ``bibkeys`` request."""
+    resp = await client.get(
+        f"{OPEN_LIBRARY_URL}/api/books",
+        params={"bibkeys": ",".join(f"ISBN:{i}" for i in isbns), "format": "json", "jscmd": "data"},
+    )
+    resp.raise_for_status()
+    data = resp.json()
+    return {i: data[f"ISBN:{i}"] for i in isbns if f"ISBN:{i}" in data}
+
+
+async def _resolve_one(client: httpx.AsyncClient, title: str, author: Optional[str], isbn: Optional[str]) -> Optional[dict]:
+    """One book's metadata, or None when Open Library has no match. HTTP errors propagate."""
+    params: dict = {"title": title, "limit": 1, "fields": OL_SEARCH_FIELDS}
+    if author:
+        params["author"] = author
+
+    if isbn:
+        edition = (await _lookup_isbns(client, [isbn])).get(isbn)
+        if edition:
+            return _meta_from_edition(edition, isbn, title, author)
+    resp = await client.get(f"{OPEN_LIBRARY_URL}/search.json", params=params)
+    resp.raise_for_status()
+    docs = resp.json().get("docs", [])
+    if not docs:
+        return None
+
+    meta = _meta_from_search_doc(docs[0], title, author)
+    if isbn:
+        # The caller's ISBN names the edition they own; don't swap it for a search hit's
+        meta["isbn"] = isbn
+    return meta
+
+
+async def _lookup_one(client: httpx.AsyncClient, title: str, author: Optional[str], isbn: Optional[str]) -> dict:
+    try:
+        meta = await _resolve_one(client, title, author, isbn)
+    except Exception:
+        meta = None
+    return meta or {"title": title, "author": author, "isbn": isbn}
+
+
+async def lookup_metadata(title: str, author: Optional[str], isbn: Optional[str] = None) -> dict:
+    """Resolve Open Library metadata, going straight to the edition when an ISBN is known."""
+    isbn = _normalize_isbn(isbn)
+    local = _lookup_local(title, author, isbn)
+    if local:
+        return local
+    if OPEN_LIBRARY_OFFLINE:
+        return {"title": title, "author": author, "isbn": isbn}
+    async with httpx.AsyncClient(timeout=15) as client:
+        return await _lookup_one(client, title, author, isbn)
+
+
+# ---------------------------------------------------------------------------
+# Offline metadata store (built by import_openlibrary_dump.py)
+# ---------------------------------------------------------------------------
+METADATA_DB_PATH = Path(os.getenv("METADATA_DB_PATH", "./data/openlibrary.db"))
+OPEN_LIBRARY_OFFLINE = os.getenv("OPEN_LIBRARY_OFFLINE", "false").lower() == "true"
+
+LOCAL_EDITION_SELECT = """
+    SELECT e.key, e.title, e.publisher, e.publish_year, e.cover_id, w.first_sentence, a.name AS author
+    FROM editions e
+    LEFT JOIN works w ON w.key = e.work_key
+    LEFT JOIN authors a ON a.key = COALESCE(e.author_key, w.author_key)
+"""
+
+_metadata_conn: Optional[sqlite3.Connection] = None
+
+
+def get_metadata_db() -> Optional[sqlite3.Connection]:
+    """Read-only connection to the local metadata store, or None if it hasn't been built."""
+    global _metadata_conn
+    if _metadata_conn is None and METADATA_DB_PATH.exists():
+        _metadata_conn = sqlite3.connect(f"file:{METADATA_DB_PATH}?mode=ro", uri=True, check_same_thread=False)
+        _metadata_conn.row_factory = sqlite3.Row
+    return _metadata_conn
+
+
+def _meta_from_local(row: sqlite3.Row, isbn: Optional[str], title: str, author: Optional[str]) -> dict:
+    cover_id = row["cover_id"]
+    return {
+        "title": row["title"] or title,
+        "author": row["author"] or author,
+        "isbn": isbn,
+        "cover_url": f"https://covers.openlibrary.org/b/id/{cover_id}-M.jpg" if cover_id else None,
+        "description": row["first_sentence"],
+        "publisher": row["publisher"],
+        "publish_year": row["publish_year"],
+        "open_library_key": row["key"],
+    }
+
+
+def _lookup_local(title: str, author: Optional[str], isbn: Optional[str]) -> Optional[dict]:
+    conn = get_metadata_db()
+    if conn is None:
+        return None
+    try:
+        if isbn:
+            row = conn.execute(
+                LOCAL_EDITION_SELECT + " JOIN isbns i ON i.edition_key = e.key WHERE i.isbn = ?", (isbn,)
+            ).fetchone()
+            if row:
+                return _meta_from_local(row, isbn, title, author)
+        surname = _normalize_key(author).split(" ")[-1] if author else ""
+        # Indexed on (title_norm, author_norm); prefer an edition with a cover, as the online search does
+        where, params = "e.title_norm = ?", [_normalize_key(title)]
+        if surname:
+            where += " AND e.author_norm = ?"
+            params.append(surname)
+        best = conn.execute(
+            LOCAL_EDITION_SELECT + f" WHERE {where} ORDER BY e.cover_id IS NULL LIMIT 1", params
+        ).fetchone()
+    except sqlite3.Error:
+        return None
+    if best is None:
+        return None
+    meta = _meta_from_local(best, isbn, title, author)
+    if not isbn:
+        edition_isbn = conn.execute(
+            "SELECT isbn FROM isbns WHERE edition_key = ? ORDER BY length(isbn) DESC LIMIT 1", (best["key"],)
+        ).fetchone()
+        meta["isbn"] = edition_isbn[0] if edition_isbn else None
+    return meta
+
+
+# ---------------------------------------------------------------------------
+# Batched Open Library resolution
+# ---------------------------------------------------------------------------
+OL_BATCH_ISBNS = int(os.getenv("OL_BATCH_ISBNS", "50"))
+OL_BATCH_TITLES = int(os.getenv("OL_BATCH_TITLES", "10"))
+OL_FALLBACK_CONCURRENCY = int(os.getenv("OL_FALLBACK_CONCURRENCY", "4"))
+OL_FALLBACK_TIMEOUT = float(os.getenv("OL_FALLBACK_TIMEOUT", "5"))  # seconds per single-book search
+OL_SCAN_BUDGET = float(os.getenv("OL_SCAN_BUDGET", "20"))  # seconds a scan spends on Open Library in total
+
+
+def _normalize_key(s: Optional[str]) -> str:
+    """Loose match key for titles/authors: lowercase, no punctuation, single spaces."""
+    s = re.sub(r"[^\w\s]", "", (s or "").lower())
+    return re.sub(r"\s+", " ", s).strip()
+
+
+def _solr_phrase(s: str) -> str:
+    return '"' + s.replace("\\", " ").replace('"', " ") + '"'
+
+
+def _title_distance(got: str, want: str) -> Optional[int]:
+    """0 for the same title, the length difference when one is a prefix of the other, else None."""
+    if got == want:
+        return 0
+    if got.startswith(want) or want.startswith(got):
+        return abs(len(got) - len(want))
+    return None
+
+
+def _match_doc(docs: list[dict], title: str, author: Optional[str], chunk_titles: frozenset = frozenset()) -> Optional[dict]:
+    """Pick the doc from a combined query that belongs to this book.
+
+    Exact title matches beat prefix matches, and a prefix match ("Dune" vs
+    "Dune Messiah") is skipped when another title in the same query
+    (``chunk_titles``, normalized) is closer to it. Ties go to the author match,
+    then to Open Library's ranking.
+    """
+    want_title = _normalize_key(title)
+    want_author = _normalize_key(author).split(" ")[-1] if author else ""
+    best, best_rank = None, None
+    for doc in docs:
+        got = _normalize_key(doc.get("title"))
+        dist = _title_distance(got, want_title) if got else None
+        if dist is None:
+            continue
+        if any((d := _title_distance(got, other)) is not None and d < dist for other in chunk_titles):
+            continue
+        author_ok = not want_author or any(want_author in _normalize_key(a) for a in doc.get("author_name") or [])
+        rank = (dist, not author_ok)
+        if best_rank is None or rank < best_rank:
+            best, best_rank = doc, rank
+    return best
+
+
+async def _resolve_remote(pending: list[tuple], results: list[Optional[dict]]) -> None:
+    """Fill ``results`` for ``pending`` (idx, title, author, isbn) from Open Library, in place.
+
+    Writes each result as soon as it is known, so a caller that cancels this
+    partway still keeps everything resolved up to that point.
+    """
+    async with httpx.AsyncClient(timeout=30) as client:
+        with_isbn = [p for p in pending if p[3]]
+        for i in range(0, len(with_isbn), OL_BATCH_ISBNS):
+            chunk = with_isbn[i:i + OL_BATCH_ISBNS]
+            try:
+                editions = await _lookup_isbns(client, list(dict.fromkeys(p[3] for p in chunk)))
+            except Exception:
+                continue
+            for idx, title, author, isbn in chunk:
+                if isbn in editions:
+                    results[idx] = _meta_from_edition(editions[isbn], isbn, title, author)
+
+        unresolved = [p for p in pending if results[p[0]] is None]
+        for i in range(0, len(unresolved), OL_BATCH_TITLES):
+            chunk = unresolved[i:i + OL_BATCH_TITLES]
+            clauses = []
+            for _, title, author, _ in chunk:
+                clause = f"title:{_solr_phrase(title)}"
+                if author:
+                    # Surname only: spine readings of initials/first names vary too much
+                    clause = f"({clause} AND author:{_solr_phrase(author.split()[-1])})"
+                clauses.append(clause)
+            try:
+                resp = await client.get(
+                    f"{OPEN_LIBRARY_URL}/search.json",
+                    params={"q": " OR ".join(clauses), "limit": 5 * len(chunk), "fields": OL_SEARCH_FIELDS},
+                )
+                resp.raise_for_status()
+                docs = resp.json().get("docs", [])
+            except Exception:
+                continue
+            chunk_titles = frozenset(_normalize_key(p[1]) for p in chunk)
+            for idx, title, author, isbn in chunk:
+                doc = _match_doc(docs, title, author, chunk_titles)
+                if doc:
+                    meta = _meta_from_search_doc(doc, title, author)
+                    if isbn:
+                        meta["isbn"] = isbn
+                    results[idx] = meta
+
+        leftovers = [p for p in pending if results[p[0]] is None]
+        if leftovers:
+            sem = asyncio.Semaphore(OL_FALLBACK_CONCURRENCY)
+
+            async def _search_one(idx: int, title: str, author: Optional[str], isbn: Optional[str]) -> None:
+                async with sem:
+                    try:
+                        results[idx] = await asyncio.wait_for(_lookup_one(client, title, author, isbn), OL_FALLBACK_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        pass
+
+            await asyncio.gather(*(_search_one(*p) for p in leftovers))
+
+
+async def lookup_metadata_batch(items: list[dict], budget: Optional[float] = None) -> list[dict]:
+    """Resolve many ``{title, author, isbn}`` items with a handful of combined requests.
+
+    The local dump-backed store is tried first. ISBNs then go through one
+    ``bibkeys`` request per chunk, title/author pairs are OR-combined into one
+    search per chunk, and only books neither pass could place fall back to a
+    single ``lookup_metadata``-style search, each cut off after OL_FALLBACK_TIMEOUT.
+    ``budget`` caps the whole network step in seconds; anything unresolved by
+    then comes back bare, for callers to queue on the enrichment backlog.
+    """
+    results: list[Optional[dict]] = [None] * len(items)
+    pending = []
+    for idx, item in enumerate(items):
+        title, author, isbn = item.get("title") or "", item.get("author"), _normalize_isbn(item.get("isbn"))
+        results[idx] = _lookup_local(title, author, isbn)
+        if results[idx] is None:
+            if OPEN_LIBRARY_OFFLINE:
+                results[idx] = {"title": title, "author": author, "isbn": isbn}
+            else:
+                pending.append((idx, title, author, isbn))
+    if not pending:
+        return results
+
+    try:
+        await asyncio.wait_for(_resolve_remote(pending, results), budget)
+    except asyncio.TimeoutError:
+        logger.warning("Open Library lookups cut off after %ss; unresolved books go to the backlog", budget)
+    for idx, title, author, isbn in pending:
+        if results[idx] is None:
+            results[idx] = {"title": title, "author": author, "isbn": isbn}
+    return results
+
+
 # ---------------------------------------------------------------------------
 # API routes
 # ---------------------------------------------------------------------------
@@ -237,7 +1332,11 @@ async def health():
     conn = get_db()
     total = conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
     conn.close()
-    return {"status": "ok", "vision_backend": backend, "total_books": total}
+    result = {"status": "ok", "vision_backend": backend, "library": current_library.get(), "total_books": total}
+    if USE_OLLAMA:
+        result["ollama"] = {"model": OLLAMA_MODEL, "keep_alive": OLLAMA_KEEP_ALIVE,
+                            "max_concurrency": OLLAMA_MAX_CONCURRENCY, **ollama_stats}
+    return result
 
 
 @app.post("/api/scan")
@@ -245,15 +1344,25 @@ async def scan_image(file: UploadFile = File(...)):
     if not (file.content_type or "").startswith("image/"):
         raise HTTPException(400, "File must be an image")
 
-    image_bytes = await file.read()
-
-    # Save upload for reference
-    filename = f"{int(time.time())}_{file.filename}"
-    (UPLOAD_DIR / filename).write_bytes(image_bytes)
+    # Save upload for reference, streaming it to disk instead of reading it into memory.
+    # mkstemp gives every upload its own new file: truncating one that another scan has
+    # memory-mapped would SIGBUS the whole process.
+    fd, tmp = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=f"{int(time.time())}_", suffix=f"_{Path(file.filename or 'upload').name}")
+    path = Path(tmp)
+    filename = path.name
+    os.chmod(path, 0o644)  # mkstemp's 0600 would differ from how uploads were always stored
+    with os.fdopen(fd, "wb") as out:
+        await run_in_threadpool(shutil.copyfileobj, file.file, out, 1024 * 1024)
+    size = path.stat().st_size
+    if not size:
+        path.unlink(missing_ok=True)
+        raise HTTPException(400, "File is empty")
 
-    # Vision extraction
+    # Vision extraction, reading the stored upload through a memory map
     try:
-        detected = await extract_books(image_bytes, file.content_type or "image/jpeg")
+        async with scan_budget.reserve(_scan_cost(size)):
+            with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as image:
+                detected = await extract_books(image, file.content_type or "image/jpeg")
     except ValueError as e:
         raise HTTPException(503, str(e))
     except Exception as e:
@@ -262,16 +1371,18 @@ async def scan_image(file: UploadFile = File(...)):
     if not detected:
         return {"books_added": 0, "detected": 0, "books": [], "message": "No books detected in image"}
 
-    # Metadata + DB insert
-    added = []
-    conn = get_db()
+    # Metadata (batched) + DB insert
+    wanted = []
     for item in detected:
         title = (item.get("title") or "").strip()
         author = (item.get("author") or "").strip() or None
-        if not title:
-            continue
+        if title:
+            wanted.append({"title": title, "author": author, "isbn": item.get("isbn")})
+    metas = await lookup_metadata_batch(wanted, budget=OL_SCAN_BUDGET)
 
-        meta = await lookup_metadata(title, author)
+    added = []
+    conn = get_db()
+    for meta in metas:
         cursor = conn.execute(
             """INSERT INTO books
                (title, author, isbn, cover_url, description, publisher, publish_year, open_library_key, section, source_image)
@@ -289,13 +1400,14 @@ async def scan_image(file: UploadFile = File(...)):
                 "source_image": filename,
             },
         )
-        conn.commit()
         row = dict(meta)
         row["id"] = cursor.lastrowid
         row["source_image"] = filename
         added.append(row)
-
+    _queue_enrichment(conn, [b["id"] for b in added if not b.get("open_library_key")])
+    conn.commit()
     conn.close()
+    library_changed()
     return {"books_added": len(added), "detected": len(detected), "books": added}
 
 
@@ -309,6 +1421,13 @@ async def list_sections():
     return {"sections": [r[0] for r in rows]}
 
 
+@app.get("/api/suggest")
+async def suggest(prefix: str = "", limit: int = 5):
+    """Top title/author/section completions for a search-box prefix, from the in-memory index."""
+    result = await run_in_threadpool(suggest_index().suggest, prefix, max(1, min(limit, 20)))
+    return {"prefix": prefix, **result}
+
+
 @app.post("/api/books")
 async def add_book(data: dict):
     title = (data.get("title") or "").strip()
@@ -319,7 +1438,7 @@ async def add_book(data: dict):
     section = (data.get("section") or "").strip() or None
     owned = int(data.get("owned", 1))
 
-    meta = await lookup_metadata(title, author)
+    meta = await lookup_metadata(title, author, isbn)
     conn = get_db()
     cursor = conn.execute(
         """INSERT INTO books
@@ -338,18 +1457,20 @@ async def add_book(data: dict):
             "owned": owned,
         },
     )
+    if not meta.get("open_library_key"):
+        _queue_enrichment(conn, [cursor.lastrowid])
     conn.commit()
     row = dict(meta)
     row["id"] = cursor.lastrowid
     row["section"] = section
     row["owned"] = owned
     conn.close()
+    library_changed()
     return row
 
 
-@app.get("/api/books")
-async def list_books(q: Optional[str] = None, section: Optional[str] = None, owned: Optional[int] = None, limit: int = 200, offset: int = 0):
-    conn = get_db()
+def _book_filters(q: Optional[str] = None, section: Optional[str] = None, owned: Optional[int] = None) -> tuple[str, list]:
+    """WHERE clause + params for the ``list_books`` filters, shared by bulk ops."""
     filters, params = [], []
     if q:
         filters.append("(title LIKE ? OR author LIKE ?)")
@@ -362,13 +1483,97 @@ async def list_books(q: Optional[str] = None, section: Optional[str] = None, own
         filters.append("owned = ?")
         params.append(owned)
     where = ("WHERE " + " AND ".join(filters)) if filters else ""
+    return where, params
+
+
+@app.get("/api/books")
+async def list_books(q: Optional[str] = None, section: Optional[str] = None, owned: Optional[int] = None, limit: int = 200, offset: int = 0, fields: Optional[str] = None):
+    columns = _select_columns(fields)
+    conn = get_db()
+    revision = _current_revision(conn)
+    where, params = _book_filters(q, section, owned)
     rows = conn.execute(
-        f"SELECT * FROM books {where} ORDER BY added_at DESC LIMIT ? OFFSET ?",
+        f"SELECT {columns} FROM books {where} ORDER BY added_at DESC LIMIT ? OFFSET ?",
         params + [limit, offset],
     ).fetchall()
     total = conn.execute(f"SELECT COUNT(*) FROM books {where}", params).fetchone()[0]
     conn.close()
-    return {"total": total, "books": [dict(r) for r in rows]}
+    return FastJSONResponse({"total": total, "revision": revision, "books": [dict(r) for r in rows]})
+
+
+# Facet name -> grouped expression; each GROUP BY can walk the matching index in INDEXES
+FACETS = {
+    "author": "author",
+    "publisher": "publisher",
+    "decade": "publish_year / 10 * 10",
+    "section": "section",
+    "owned": "owned",
+}
+
+
+@app.get("/api/facets")
+async def book_facets(q: Optional[str] = None, section: Optional[str] = None, owned: Optional[int] = None, limit: int = 50):
+    """Book counts per author, publisher, decade, section and owned, under the ``list_books`` filters."""
+    where, params = _book_filters(q, section, owned)
+    limit = max(1, min(limit, 500))
+    conn = get_db()
+    total = conn.execute(f"SELECT COUNT(*) FROM books {where}", params).fetchone()[0]
+    facets = {}
+    for name, expr in FACETS.items():
+        rows = conn.execute(
+            f"SELECT {expr} AS value, COUNT(*) AS count FROM books {where} GROUP BY value ORDER BY count DESC, value LIMIT ?",
+            params + [limit],
+        ).fetchall()
+        facets[name] = [dict(r) for r in rows]
+    conn.close()
+    return FastJSONResponse({"total": total, "facets": facets})
+
+
+@app.get("/api/books/changes")
+async def book_changes(since: int = 0, fields: Optional[str] = None):
+    """Rows changed and ids deleted after revision ``since``; pass back ``revision`` next time."""
+    columns = _select_columns(fields)
+    conn = get_db()
+    changes = _read_changes(conn, since, columns)
+    conn.close()
+    return FastJSONResponse(changes)
+
+
+@app.get("/api/events")
+async def library_events():
+    """Server-sent events: one coalesced ``books`` message per burst of writes."""
+    feed = change_feed()
+    queue = feed.subscribe()
+
+    async def stream():
+        try:
+            yield f"event: hello\ndata: {json.dumps({'revision': feed.revision})}\n\n"
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: books\ndata: {payload}\n\n"
+        finally:
+            feed.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/books/{book_id}")
+async def get_book(book_id: int, fields: Optional[str] = "all"):
+    columns = _select_columns(fields)
+    conn = get_db()
+    row = conn.execute(f"SELECT {columns} FROM books WHERE id = ?", (book_id,)).fetchone()
+    conn.close()
+    if row is None:
+        raise HTTPException(404, "Book not found")
+    return FastJSONResponse(dict(row))
 
 
 @app.delete("/api/books/{book_id}")
@@ -379,13 +1584,80 @@ async def delete_book(book_id: int):
     conn.close()
     if result.rowcount == 0:
         raise HTTPException(404, "Book not found")
+    library_changed()
     return {"ok": True}
 
 
+def _bulk_selection(data: dict) -> list[tuple[str, list]]:
+    """WHERE clauses picking the books a bulk request targets, by ``ids`` or ``filter``.
+
+    Id lists are chunked to stay under SQLite's bound-parameter limit.
+    """
+    ids = data.get("ids")
+    flt = data.get("filter")
+    if ids is not None and flt is not None:
+        raise HTTPException(400, "Provide either ids or filter, not both")
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            raise HTTPException(400, "ids must be a list of integers")
+    if ids:
+        return [
+            (f"WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            for chunk in (ids[i:i + 500] for i in range(0, len(ids), 500))
+        ]
+    if isinstance(flt, dict):
+        unknown = set(flt) - {"q", "section", "owned"}
+        if unknown:
+            raise HTTPException(400, f"Unknown filter keys: {', '.join(sorted(unknown))}")
+        where, params = _book_filters(flt.get("q"), flt.get("section"), flt.get("owned"))
+        if where:
+            return [(where, params)]
+    raise HTTPException(400, "Provide non-empty ids or filter")
+
+
+@app.patch("/api/books")
+async def bulk_patch_books(data: dict):
+    """Apply one set of field changes to many books in a single transaction."""
+    changes = data.get("set") or {}
+    if not isinstance(changes, dict):
+        raise HTTPException(400, "set must be an object of field: value")
+    updates = {k: v for k, v in changes.items() if k in PATCHABLE_FIELDS}
+    if not updates:
+        raise HTTPException(400, "No valid fields to update")
+    nested = [k for k, v in updates.items() if isinstance(v, (dict, list))]
+    if nested:
+        raise HTTPException(400, f"Values must be plain text or numbers: {', '.join(nested)}")
+    selection = _bulk_selection(data)
+    set_clause = ", ".join(f"{k} = ?" for k in updates)
+    conn = get_db()
+    updated = 0
+    with conn:
+        for where, params in selection:
+            updated += conn.execute(f"UPDATE books SET {set_clause} {where}", list(updates.values()) + params).rowcount
+    conn.close()
+    if updated:
+        library_changed()
+    return {"updated": updated}
+
+
+@app.delete("/api/books")
+async def bulk_delete_books(data: dict):
+    """Delete many books, by ``ids`` or ``filter``, in a single transaction."""
+    selection = _bulk_selection(data)
+    conn = get_db()
+    deleted = 0
+    with conn:
+        for where, params in selection:
+            deleted += conn.execute(f"DELETE FROM books {where}", params).rowcount
+    conn.close()
+    if deleted:
+        library_changed()
+    return {"deleted": deleted}
+
+
 @app.patch("/api/books/{book_id}")
 async def patch_book(book_id: int, data: dict):
-    allowed = {"owned", "title", "author", "section", "cover_url", "isbn", "shelf_location"}
-    updates = {k: v for k, v in data.items() if k in allowed}
+    updates = {k: v for k, v in data.items() if k in PATCHABLE_FIELDS}
     if not updates:
         raise HTTPException(400, "No valid fields to update")
     conn = get_db()
@@ -397,9 +1669,250 @@ async def patch_book(book_id: int, data: dict):
     conn.close()
     if result.rowcount == 0:
         raise HTTPException(404, "Book not found")
+    library_changed()
     return dict(row)
 
 
+# ---------------------------------------------------------------------------
+# Admin diagnostics
+# ---------------------------------------------------------------------------
+@app.get("/api/admin/slow-queries", dependencies=[Depends(require_admin)])
+async def list_slow_queries():
+    return {"threshold_ms": SLOW_QUERY_MS, "queries": list(reversed(slow_queries))}
+
+
+@app.get("/api/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    files = sorted(PROFILE_DIR.glob("*.*"), reverse=True) if PROFILE_DIR.exists() else []
+    return {"profiles": [f.name for f in files]}
+
+
+@app.get("/api/admin/profiles/{name}", dependencies=[Depends(require_admin)])
+async def get_profile(name: str):
+    path = PROFILE_DIR / Path(name).name
+    if not path.is_file():
+        raise HTTPException(404, "Profile not found")
+    return FileResponse(path)
+
+
+# ---------------------------------------------------------------------------
+# Library administration (cross-library)
+# ---------------------------------------------------------------------------
+def _library_stats(name: str) -> dict:
+    conn = get_db(name)
+    total, owned = conn.execute("SELECT COUNT(*), COALESCE(SUM(owned), 0) FROM books").fetchone()
+    revision = _current_revision(conn)
+    conn.close()
+    return {
+        "library": name,
+        "total_books": total,
+        "owned": owned,
+        "wishlist": total - owned,
+        "revision": revision,
+        "size_bytes": library_path(name).stat().st_size,
+    }
+
+
+@app.get("/api/admin/libraries", dependencies=[Depends(require_admin)])
+async def library_stats():
+    # One worker thread per shard, so big libraries don't serialise the sweep
+    stats = await asyncio.gather(*(run_in_threadpool(_library_stats, n) for n in list_libraries()))
+    return {"libraries": stats, "total_books": sum(s["total_books"] for s in stats)}
+
+
+@app.post("/api/admin/libraries", dependencies=[Depends(require_admin)])
+async def create_library(data: dict):
+    name = (data.get("name") or "").strip().lower()
+    if not LIBRARY_NAME.match(name):
+        raise HTTPException(400, "Library names are 1-64 chars of a-z, 0-9, '-' and '_'")
+    if library_exists(name):
+        raise HTTPException(409, f"Library {name} already exists")
+    await run_in_threadpool(prepare_library, name)
+    return {"library": name, "path": f"/lib/{name}/"}
+
+
+@app.get("/api/admin/export/json", dependencies=[Depends(require_admin)])
+async def export_all_json():
+    """Every library's books in one JSON array, each row tagged with its library."""
+
+    def rows():
+        yield b"["
+        first = True
+        for name in list_libraries():
+            conn = get_db(name)
+            try:
+                for r in conn.execute("SELECT * FROM books ORDER BY id"):
+                    row = dict(r)
+                    row["library"] = name
+                    yield (b"" if first else b",") + dumps_json(row)
+                    first = False
+            finally:
+                conn.close()
+        yield b"]"
+
+    return StreamingResponse(
+        rows(),
+        media_type="application/json",
+        headers={"Content-Disposition": "attachment; filename=shelfscan-all-libraries.json"},
+    )
+
+
+# ---------------------------------------------------------------------------
+# Manifest reconciliation
+# ---------------------------------------------------------------------------
+def _manifest_owned(value) -> int:
+    if isinstance(value, str):
+        return 0 if value.strip().lower() in ("0", "false", "no", "wishlist", "") else 1
+    return 1 if value is None else int(bool(value))
+
+
+def _parse_manifest(data: dict) -> list[dict]:
+    """Normalise manifest entries; ``section``/``owned`` at the top level act as defaults."""
+    books = data.get("books") or []
+    if not isinstance(books, list):
+        raise HTTPException(400, "books must be a list of objects")
+    if data.get("section") is not None and not isinstance(data["section"], str):
+        raise HTTPException(400, "section must be text")
+    entries, seen = [], set()
+    for n, raw in enumerate(books):
+        if not isinstance(raw, dict):
+            raise HTTPException(400, f"Row {n}: expected an object, got {raw!r:.80}")
+        if isinstance(raw.get("isbn"), int) and not isinstance(raw["isbn"], bool):
+            raw = {**raw, "isbn": str(raw["isbn"])}  # JSON manifests often carry ISBN-13s as numbers
+        bad = [k for k in ("title", "author", "isbn", "section") if raw.get(k) is not None and not isinstance(raw[k], str)]
+        if bad:
+            raise HTTPException(400, f"Row {n}: {', '.join(bad)} must be text")
+        title = (raw.get("title") or "").strip()
+        if not title:
+            continue
+        section = (raw.get("section") or data.get("section") or "").strip() or None
+        entry = {
+            "title": title,
+            "author": (raw.get("author") or "").strip() or None,
+            "isbn": _normalize_isbn(raw.get("isbn")),
+            "section": section,
+            "owned": _manifest_owned(raw.get("owned", data.get("owned", 1))),
+        }
+        key = entry["isbn"] or (section, _normalize_key(title))
+        if key not in seen:
+            seen.add(key)
+            entries.append(entry)
+    return entries
+
+
+def _plan_reconcile(conn: sqlite3.Connection, entries: list[dict]) -> dict:
+    """Diff manifest entries against the DB in one pass over the affected rows.
+
+    Rows are matched by ISBN first, then by section + normalized title. Books
+    without a section form their own bucket, so an unsectioned entry still finds
+    an unsectioned row instead of being planned as a duplicate insert.
+    """
+    sections = sorted({e["section"] for e in entries if e["section"]})
+    isbns = sorted({e["isbn"] for e in entries if e["isbn"]})
+    select = "SELECT id, title, author, isbn, section, owned FROM books"
+    rows = []
+    # All lookups hit indexes (idx_books_section, idx_books_isbn_norm)
+    for column, values in (("section", sections), (ISBN_NORM_SQL, isbns)):
+        for i in range(0, len(values), 500):
+            chunk = values[i:i + 500]
+            rows += conn.execute(f"{select} WHERE {column} IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+    if any(e["section"] is None for e in entries):
+        rows += conn.execute(f"{select} WHERE section IS NULL").fetchall()
+
+    buckets = {e["section"] for e in entries}
+    by_isbn, by_title, unmatched = {}, {}, {}
+    for r in rows:
+        if r["isbn"]:
+            by_isbn.setdefault(_normalize_isbn(r["isbn"]) or r["isbn"], r)
+        by_title.setdefault((r["section"], _normalize_key(r["title"])), r)
+        if r["section"] in sections or (r["section"] is None and None in buckets):
+            unmatched[r["id"]] = r
+
+    plan: dict = {"insert": [], "update": [], "unchanged": [], "extra": []}
+    for e in entries:
+        row = by_isbn.get(e["isbn"]) if e["isbn"] else None
+        row = row or by_title.get((e["section"], _normalize_key(e["title"])))
+        if row is None:
+            plan["insert"].append(e)
+            continue
+        unmatched.pop(row["id"], None)
+        changes = {}
+        for field in ("owned", "isbn", "section"):
+            current = _normalize_isbn(row[field]) if field == "isbn" else row[field]
+            if e[field] is not None and e[field] != current:
+                changes[field] = [row[field], e[field]]
+        if e["author"] and not row["author"]:
+            changes["author"] = [None, e["author"]]
+        if changes:
+            plan["update"].append({"id": row["id"], "title": row["title"], "changes": changes})
+        else:
+            plan["unchanged"].append({"id": row["id"], "title": row["title"]})
+
+    plan["extra"] = [{"id": r["id"], "title": r["title"], "section": r["section"]} for r in unmatched.values()]
+    return plan
+
+
+@app.post("/api/reconcile")
+async def reconcile(data: dict):
+    """Make the DB match a manifest of ``{section, owned, title, author, isbn}`` books.
+
+    Dry run by default: returns the plan. With ``"dry_run": false`` new rows are
+    enriched concurrently and all inserts and updates commit in one transaction.
+    Rows in the manifest's sections that the manifest doesn't list are only reported.
+    """
+    entries = _parse_manifest(data)
+    if not entries:
+        raise HTTPException(400, "Manifest has no books")
+    dry_run = data.get("dry_run", True) not in (False, 0, "false", "0")
+
+    conn = get_db()
+    plan = _plan_reconcile(conn, entries)
+    conn.close()
+    summary = {k: len(v) for k, v in plan.items()}
+    if dry_run:
+        return FastJSONResponse({"dry_run": True, "summary": summary, "plan": plan})
+
+    # Enrichment only for the rows we're about to create
+    metas = await lookup_metadata_batch(plan["insert"])
+    inserts = []
+    for e, meta in zip(plan["insert"], metas):
+        inserts.append({
+            "title": e["title"],
+            "author": e["author"] or meta.get("author"),
+            "isbn": e["isbn"] or meta.get("isbn"),
+            "cover_url": meta.get("cover_url"),
+            "description": meta.get("description"),
+            "publisher": meta.get("publisher"),
+            "publish_year": meta.get("publish_year"),
+            "open_library_key": meta.get("open_library_key"),
+            "section": e["section"],
+            "owned": e["owned"],
+        })
+
+    conn = get_db()
+    with conn:
+        unresolved = []
+        for row in inserts:
+            cursor = conn.execute(
+                """INSERT INTO books
+                   (title, author, isbn, cover_url, description, publisher, publish_year, open_library_key, section, owned)
+                   VALUES (:title, :author, :isbn, :cover_url, :description, :publisher, :publish_year, :open_library_key, :section, :owned)""",
+                row,
+            )
+            if not row["open_library_key"]:
+                unresolved.append(cursor.lastrowid)
+        _queue_enrichment(conn, unresolved)
+        for u in plan["update"]:
+            fields = list(u["changes"])
+            conn.execute(
+                f"UPDATE books SET {', '.join(f'{f} = ?' for f in fields)} WHERE id = ?",
+                [u["changes"][f][1] for f in fields] + [u["id"]],
+            )
+    conn.close()
+    library_changed()
+    return FastJSONResponse({"dry_run": False, "summary": summary, "plan": plan})
+
+
 @app.get("/api/export/csv")
 async def export_csv():
     conn = get_db()
@@ -421,18 +1934,350 @@ async def export_csv():
     )
 
 
+# ---------------------------------------------------------------------------
+# SQLite snapshots (online backup API)
+# ---------------------------------------------------------------------------
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.005
+
+
+def _snapshot_to(dest: Path, library: str) -> None:
+    """Copy a library's DB into ``dest`` a few pages at a time so writers get the lock in between."""
+    src = sqlite3.connect(str(library_path(library)))
+    dst = sqlite3.connect(str(dest))
+    try:
+        src.backup(dst, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP)
+    finally:
+        dst.close()
+        src.close()
+
+
+def _gzip_file(path: Path, chunk_size: int = 256 * 1024):
+    """Stream ``path`` as a gzip file and delete it afterwards."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    try:
+        with open(path, "rb") as fh:
+            while chunk := fh.read(chunk_size):
+                if out := compressor.compress(chunk):
+                    yield out
+        yield compressor.flush()
+    finally:
+        path.unlink(missing_ok=True)
+
+
+# Restores write their safety copy under this prefix so it rotates apart from scheduled backups
+PRE_RESTORE_PREFIX = "pre-restore-"
+
+
+def _backup_prefix(library: str) -> str:
+    return "shelfscan" if library == DEFAULT_LIBRARY else f"library-{library}"
+
+
+def _backup_name(library: str) -> str:
+    return f"{_backup_prefix(library)}-{time.strftime('%Y%m%d-%H%M%S')}.db.gz"
+
+
+def _write_backup(library: str, pre_restore: bool = False) -> Path:
+    BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=BACKUP_DIR, suffix=".db")
+    os.close(fd)
+    tmp = Path(tmp)
+    dest = BACKUP_DIR / ((PRE_RESTORE_PREFIX if pre_restore else "") + _backup_name(library))
+    _snapshot_to(tmp, library)
+    with open(dest, "wb") as fh:
+        for chunk in _gzip_file(tmp):
+            fh.write(chunk)
+    # Anchored on the timestamp so library "home" never rotates away "home-2"'s backups
+    if BACKUP_KEEP > 0:
+        prefix = dest.name.rsplit("-", 2)[0]
+        older = sorted(p for p in BACKUP_DIR.glob(f"{prefix}-????????-??????.db.gz") if p != dest)
+        for old in older[:max(len(older) - (BACKUP_KEEP - 1), 0)]:
+            old.unlink(missing_ok=True)
+    return dest
+
+
+@background_job
+async def scheduled_backups() -> None:
+    if BACKUP_INTERVAL_HOURS <= 0:
+        return
+    while True:
+        await asyncio.sleep(BACKUP_INTERVAL_HOURS * 3600)
+        for library in list_libraries():
+            try:
+                path = await run_in_threadpool(_write_backup, library)
+                logger.info("scheduled backup written to %s", path)
+            except Exception:
+                logger.exception("scheduled backup of %s failed", library)
+
+
+@app.get("/api/export/sqlite")
+async def export_sqlite():
+    fd, tmp = tempfile.mkstemp(dir=DB_PATH.parent, suffix=".snapshot")
+    os.close(fd)
+    tmp = Path(tmp)
+    library = current_library.get()
+    await run_in_threadpool(_snapshot_to, tmp, library)
+    return StreamingResponse(
+        _gzip_file(tmp),
+        media_type="application/gzip",
+        # Already compressed; keep GZipMiddleware from wrapping it again
+        headers={
+            "Content-Encoding": "identity",
+            "Content-Disposition": f"attachment; filename={_backup_name(library)}",
+        },
+        background=BackgroundTask(tmp.unlink, missing_ok=True),
+    )
+
+
+def _restore_from(candidate: Path, library: str) -> dict:
+    """Verify ``candidate`` and copy it over a library's DB, keeping revisions monotonic."""
+    check = sqlite3.connect(f"file:{candidate}?mode=ro", uri=True)
+    try:
+        result = check.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != "ok":
+            raise HTTPException(400, f"Snapshot failed integrity check: {result}")
+        if not check.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books'").fetchone():
+            raise HTTPException(400, "Snapshot has no books table")
+    except sqlite3.DatabaseError as e:
+        raise HTTPException(400, f"Not a SQLite database: {e}")
+    finally:
+        check.close()
+
+    safety = _write_backup(library, pre_restore=True)
+    live = sqlite3.connect(str(library_path(library)))
+    old_rev = _current_revision(live)
+    old_ids = {r[0] for r in live.execute("SELECT id FROM books")}
+    src = sqlite3.connect(str(candidate))
+    try:
+        src.backup(live)
+    finally:
+        src.close()
+        live.close()
+
+    # Older snapshots may predate later columns/triggers
+    migrate_db(library_path(library))
+    conn = get_db(library)
+    with conn:
+        # Everything counts as changed after a restore, and vanished rows get tombstones,
+        # so delta-syncing clients converge instead of seeing the revision go backwards
+        rev = max(old_rev, _current_revision(conn)) + 1
+        conn.execute("UPDATE library_revision SET rev = ? WHERE id = 1", (rev,))
+        conn.execute("UPDATE books SET revision = ?", (rev,))
+        new_ids = {r[0] for r in conn.execute("SELECT id FROM books")}
+        conn.executemany(
+            "INSERT OR REPLACE INTO book_tombstones (id, revision) VALUES (?, ?)",
+            [(i, rev) for i in old_ids - new_ids],
+        )
+        total = len(new_ids)
+    conn.close()
+    return {"ok": True, "total_books": total, "revision": rev, "pre_restore_backup": safety.name}
+
+
+@app.post("/api/admin/restore", dependencies=[Depends(require_admin)])
+async def restore_sqlite(file: UploadFile = File(...)):
+    """Restore from a ``/api/export/sqlite`` snapshot (gzip or plain .db)."""
+    fd, tmp = tempfile.mkstemp(dir=DB_PATH.parent, suffix=".restore")
+    os.close(fd)
+    tmp = Path(tmp)
+    try:
+        head = await file.read(2)
+        await file.seek(0)
+        src = gzip.GzipFile(fileobj=file.file, mode="rb") if head == b"\x1f\x8b" else file.file
+        with open(tmp, "wb") as fh:
+            try:
+                await run_in_threadpool(shutil.copyfileobj, src, fh, 1024 * 1024)
+            except (OSError, EOFError) as e:
+                raise HTTPException(400, f"Could not read snapshot: {e}")
+        result = await run_in_threadpool(_restore_from, tmp, current_library.get())
+    finally:
+        tmp.unlink(missing_ok=True)
+    library_changed()
+    return result
+
+
 @app.get("/api/export/json")
 async def export_json():
     conn = get_db()
     rows = [dict(r) for r in conn.execute("SELECT * FROM books ORDER BY added_at DESC").fetchall()]
     conn.close()
+    body = orjson.dumps(rows, option=orjson.OPT_INDENT_2) if orjson is not None else json.dumps(rows, indent=2)
     return StreamingResponse(
-        iter([json.dumps(rows, indent=2)]),
+        iter([body]),
         media_type="application/json",
         headers={"Content-Disposition": "attachment; filename=shelfscan-library.json"},
     )
 
 
+# ---------------------------------------------------------------------------
+# Enrichment backlog (deferred Open Library retries)
+# ---------------------------------------------------------------------------
+# Local hours during which the worker runs, e.g. "1-6" or "22-6"; empty means any time
+ENRICH_WINDOW = os.getenv("ENRICH_WINDOW", "")
+if ENRICH_WINDOW and not re.fullmatch(r"([01]?\d|2[0-4])-([01]?\d|2[0-4])", ENRICH_WINDOW):
+    raise ValueError(f"ENRICH_WINDOW must look like '1-6' (local hours), got {ENRICH_WINDOW!r}")
+ENRICH_INTERVAL_SECONDS = float(os.getenv("ENRICH_INTERVAL_SECONDS", "10"))  # pause between lookups
+ENRICH_BACKOFF_SECONDS = float(os.getenv("ENRICH_BACKOFF_SECONDS", "300"))  # first retry; doubles per failure
+ENRICH_BACKOFF_MAX_SECONDS = float(os.getenv("ENRICH_BACKOFF_MAX_SECONDS", str(7 * 86400)))
+ENRICH_MAX_ATTEMPTS = int(os.getenv("ENRICH_MAX_ATTEMPTS", "8"))
+
+
+def _queue_enrichment(conn: sqlite3.Connection, book_ids: list[int]) -> None:
+    """Add books to the backlog; the caller commits along with its own writes."""
+    due = time.time() + ENRICH_BACKOFF_SECONDS
+    conn.executemany(
+        "INSERT OR IGNORE INTO enrichment_backlog (book_id, next_attempt_at) VALUES (?, ?)",
+        [(i, due) for i in book_ids],
+    )
+
+
+def _in_enrich_window(hour: Optional[int] = None) -> bool:
+    if not ENRICH_WINDOW:
+        return True
+    start, end = (int(h) for h in ENRICH_WINDOW.split("-"))
+    hour = time.localtime().tm_hour if hour is None else hour
+    return start <= hour < end if start <= end else (hour >= start or hour < end)
+
+
+def _enrich_backoff(attempts: int, retry_after: float = 0) -> float:
+    """Seconds until the next try: doubling from ENRICH_BACKOFF_SECONDS, jittered, capped."""
+    delay = min(ENRICH_BACKOFF_SECONDS * 2 ** (attempts - 1), ENRICH_BACKOFF_MAX_SECONDS)
+    return max(delay * random.uniform(0.8, 1.2), retry_after)
+
+
+async def _resolve_metadata(title: str, author: Optional[str], isbn: Optional[str]) -> Optional[dict]:
+    """Like ``lookup_metadata`` but reports failures: None for no match, raises on HTTP errors."""
+    isbn = _normalize_isbn(isbn)
+    local = _lookup_local(title, author, isbn)
+    if local or OPEN_LIBRARY_OFFLINE:
+        return local
+    async with httpx.AsyncClient(timeout=30) as client:
+        return await _resolve_one(client, title, author, isbn)
+
+
+async def _enrich_next(library: str) -> bool:
+    """Retry the library's most overdue backlog entry. Returns False when nothing is due."""
+    conn = get_db(library)
+    row = conn.execute(
+        """SELECT b.id, b.title, b.author, b.isbn, b.open_library_key, e.attempts
+           FROM enrichment_backlog e JOIN books b ON b.id = e.book_id
+           WHERE e.status = 'pending' AND e.next_attempt_at <= ?
+           ORDER BY e.next_attempt_at LIMIT 1""",
+        (time.time(),),
+    ).fetchone()
+    conn.close()
+    if not row:
+        return False
+
+    meta, error, retry_after = None, None, 0.0
+    if not row["open_library_key"]:  # may have been filled in by hand since it was queued
+        try:
+            meta = await _resolve_metadata(row["title"], row["author"], row["isbn"])
+            if meta is None:
+                error = "no match"
+        except httpx.HTTPStatusError as e:
+            error = f"HTTP {e.response.status_code}"
+            try:
+                retry_after = float(e.response.headers.get("Retry-After") or 0)
+            except ValueError:
+                pass
+        except Exception as e:  # timeouts, bad JSON from a maintenance page, ...
+            error = (str(e) or type(e).__name__)[:500]
+
+    attempts = row["attempts"] + 1
+    conn = get_db(library)
+    with conn:
+        if error is None:
+            if meta:
+                # Fill gaps only; anything already set may have been edited by hand
+                conn.execute(
+                    """UPDATE books SET
+                         isbn = COALESCE(isbn, :isbn), cover_url = COALESCE(cover_url, :cover_url),
+                         description = COALESCE(description, :description),
+                         publisher = COALESCE(publisher, :publisher),
+                         publish_year = COALESCE(publish_year, :publish_year),
+                         open_library_key = COALESCE(open_library_key, :open_library_key)
+                       WHERE id = :id""",
+                    {**{k: meta.get(k) for k in ("isbn", "cover_url", "description", "publisher",
+                                                 "publish_year", "open_library_key")}, "id": row["id"]},
+                )
+            conn.execute(
+                """UPDATE enrichment_backlog SET status = 'done', attempts = ?, last_error = NULL,
+                     updated_at = CURRENT_TIMESTAMP WHERE book_id = ?""",
+                (attempts, row["id"]),
+            )
+        else:
+            conn.execute(
+                """UPDATE enrichment_backlog SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ?,
+                     updated_at = CURRENT_TIMESTAMP WHERE book_id = ?""",
+                ("gave_up" if attempts >= ENRICH_MAX_ATTEMPTS else "pending", attempts, error,
+                 time.time() + _enrich_backoff(attempts, retry_after), row["id"]),
+            )
+    conn.close()
+    if meta:
+        token = current_library.set(library)
+        library_changed()
+        current_library.reset(token)
+    return True
+
+
+@background_job
+async def enrichment_worker() -> None:
+    """Work through every library's backlog one lookup at a time, off-peak and never during a scan."""
+    while True:
+        await asyncio.sleep(ENRICH_INTERVAL_SECONDS)
+        if not _in_enrich_window() or scan_budget.in_use:
+            continue
+        for library in list_libraries():
+            try:
+                await _enrich_next(library)
+            except Exception:
+                logger.exception("enrichment retry in %s failed", library)
+
+
+@app.get("/api/enrichment")
+async def enrichment_progress():
+    """Backlog counts by status, when the next retry is due and the most recent failures."""
+    conn = get_db()
+    counts = dict(conn.execute("SELECT status, COUNT(*) FROM enrichment_backlog GROUP BY status").fetchall())
+    next_at = conn.execute(
+        "SELECT MIN(next_attempt_at) FROM enrichment_backlog WHERE status = 'pending'"
+    ).fetchone()[0]
+    failures = conn.execute(
+        """SELECT e.book_id, b.title, e.status, e.attempts, e.last_error, e.next_attempt_at
+           FROM enrichment_backlog e JOIN books b ON b.id = e.book_id
+           WHERE e.last_error IS NOT NULL AND e.status != 'done'
+           ORDER BY e.updated_at DESC LIMIT 20""",
+    ).fetchall()
+    conn.close()
+    return {
+        **{status: counts.get(status, 0) for status in ("pending", "done", "gave_up")},
+        "next_attempt_at": next_at,
+        "window": ENRICH_WINDOW or "any",
+        "in_window": _in_enrich_window(),
+        "recent_failures": [dict(r) for r in failures],
+    }
+
+
+@app.post("/api/admin/enrichment/queue", dependencies=[Depends(require_admin)])
+async def queue_enrichment():
+    """Queue every book still without Open Library data and give up-on entries another round."""
+    conn = get_db()
+    due = time.time()
+    with conn:
+        requeued = conn.execute(
+            """UPDATE enrichment_backlog SET status = 'pending', attempts = 0, next_attempt_at = ?,
+                 updated_at = CURRENT_TIMESTAMP WHERE status = 'gave_up'""",
+            (due,),
+        ).rowcount
+        queued = conn.execute(
+            """INSERT OR IGNORE INTO enrichment_backlog (book_id, next_attempt_at)
+               SELECT id, ? FROM books WHERE open_library_key IS NULL AND cover_url IS NULL""",
+            (due,),
+        ).rowcount
+    conn.close()
+    return {"queued": queued, "requeued": requeued}
+
+
 # ---------------------------------------------------------------------------
 # Serve frontend (must be last)
 # ---------------------------------------------------------------------------
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Reconcile a collection manifest against Bookr in one pass.
+The manifest is a CSV with columns section, owned, title, author, isbn (header
+row required), or a JSON list of objects with the same keys (or an object
+with that list under "books" and optional section/owned defaults).
+Shows the plan by default; pass --apply to write it in a single transaction.
+  python3 reconcile_manifest.py masterworks.csv
+  python3 reconcile_manifest.py masterworks.csv --apply
+"""
+import csv, json, os, sys, urllib.request
+
+API = os.getenv("BOOKR_API", "http://localhost:8000")
+
+
+def read_manifest(path):
+    with open(path, encoding="utf-8") as fh:
+        if path.endswith(".json"):
+            return json.load(fh)
+        return list(csv.DictReader(fh))
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if len(args) != 1:
+        print(__doc__)
+        sys.exit(1)
+    apply = "--apply" in sys.argv
+
+    manifest = read_manifest(args[0])
+    # A JSON manifest may be an object carrying "books" plus top-level section/owned defaults
+    body = dict(manifest) if isinstance(manifest, dict) else {"books": manifest}
+    body["dry_run"] = not apply
+    payload = json.dumps(body).encode()
+    req = urllib.request.Request(
+        f"{API}/api/reconcile",
+        data=payload,
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(req, timeout=300) as resp:
+        result = json.loads(resp.read())
+
+    plan = result["plan"]
+    for book in plan["insert"]:
+        status = "owned" if book["owned"] else "wishlist"
+        print(f"  +  {book['title']} ({status}, {book['section'] or 'no section'})")
+    for book in plan["update"]:
+        changes = ", ".join(f"{k}: {old!r} → {new!r}" for k, (old, new) in book["changes"].items())
+        print(f"  ~  {book['title']} ({changes})")
+    for book in plan["extra"]:
+        print(f"  ?  {book['title']} (in DB, not in manifest)")
+
+    s = result["summary"]
+    verb = "Applied" if apply else "Dry run"
+    print(f"\n{verb} — {s['insert']} to add, {s['update']} to update, "
+          f"{s['unchanged']} unchanged, {s['extra']} only in DB")
+    if not apply and (s["insert"] or s["update"]):
+        print("Re-run with --apply to write these changes.")